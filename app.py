@@ -2,162 +2,613 @@
 from flask import Flask, render_template, request, jsonify
 import sympy as sp
 import re
+import os
+import sys
+import cmath
+import math
+import signal
+import threading
+import itertools
+import multiprocessing
+import concurrent.futures
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache, wraps
+from tokenize import TokenError
+from sympy.parsing.sympy_parser import (
+    parse_expr, standard_transformations, convert_xor, implicit_multiplication,
+    implicit_application, function_exponentiation,
+)
+
+try:
+    from flask_compress import Compress
+except ImportError:  # optional: gzip responses when installed
+    Compress = None
+
+try:
+    import numpy  # noqa: F401
+    _LAMBDIFY_MODULE = 'numpy'
+except ImportError:
+    _LAMBDIFY_MODULE = 'mpmath'  # handles complex arguments, unlike math
+
+try:
+    from numba import njit
+except ImportError:  # optional: JIT-compile /api/evaluate functions
+    njit = None
 
 app = Flask(__name__)
+app.json.compact = True
+if Compress is not None:
+    Compress(app)
+
+# parser configuration, built once: '^' is handled by convert_xor and "2x" by
+# implicit multiplication, so inputs don't need rewriting before parsing.
+# split_symbols is left out on purpose: multi-letter names like "xy" or "rate"
+# must stay single symbols to match detect_symbols.
+_TX = standard_transformations + (
+    convert_xor, implicit_multiplication, implicit_application, function_exponentiation,
+)
+# one-letter symbols built once at import rather than on every request
+_COMMON_SYMS = {c: sp.Symbol(c) for c in 'abcdefghijklmnopqrstuvwxyz'}
+_LOCAL = {name: _COMMON_SYMS[name] for name in ('x', 'y', 'z', 't')}
+# diff(...)/integrate(...) parse to unevaluated Derivative/Integral objects;
+# with no variable given, the primary symbol is used: the first free symbol
+# by name, so function names like asin or ln are never picked
+def _primary_of(f):
+    return min(f.free_symbols, key=str, default=_COMMON_SYMS['x'])
+
+def _derivative(f, *wrt):
+    return sp.Derivative(f, *(wrt or (_primary_of(f),)))
+
+def _integral(f, *limits):
+    return sp.Integral(f, *(limits or (_primary_of(f),)))
+
+_UNEVALUATED = {**_LOCAL, 'diff': _derivative, 'integrate': _integral}
+# step text is shown inline in the page, so the flat string form is enough;
+# sp.pretty's 2D layout is much more expensive to build
+_fmt = sp.sstr
 
 # --- small utilities -------------------------------------------------------
 def sanitize_input(text: str) -> str:
     """Normalize user math input.
-    - Replace caret '^' with Python power '**'
     - Normalize unicode division '÷' to '/'
     - Strip surrounding whitespace
     """
     if not isinstance(text, str):
         return text
-    return text.replace('^', '**').replace('÷', '/').strip()
+    return _sanitize_cached(text)
+
+@lru_cache(maxsize=8192)
+def _sanitize_cached(text):
+    return text.replace('÷', '/').strip()
+
+# limits on what reaches SymPy; small inputs can still make simplify or
+# integrate run for a long time, see _WORKER_BUDGET
+_MAX_INPUT_LEN = 512
+_MAX_OPS = 200
+_MAX_EXPONENT = 10000   # symbolic base, e.g. (x+1)^n
+# digits in all numeric powers together, e.g. 7^(7^9) or (1/3)^(10^7); kept
+# well below CPython's int-to-str limit (4300 by default) so results can be
+# formatted, leaving room for the literals in a _MAX_INPUT_LEN query
+_MAX_DIGITS = min(3000, (getattr(sys, 'get_int_max_str_digits', lambda: 0)() or 4300) - 2*_MAX_INPUT_LEN)
+
+def _check_size(s):
+    """Raise ValueError if s is too big to evaluate, judged on an unevaluated parse.
+
+    Evaluating must come after this check: huge integer powers are computed
+    in C during parsing, where SIGALRM can't interrupt them.
+    """
+    tree = parse_expr(s, transformations=_TX, local_dict=_UNEVALUATED, evaluate=False)
+    if sp.count_ops(tree) > _MAX_OPS:
+        raise ValueError("Expression too complex")
+    # postorder: inner exponents and bases are vetted before they are evaluated
+    digits = 0
+    for node in sp.postorder_traversal(tree):
+        if not (node.is_Pow and node.exp.is_number):
+            continue
+        try:
+            e = abs(sp.N(node.exp))
+            if not node.base.is_number:
+                too_big = e > _MAX_EXPONENT
+            else:
+                b = node.base.doit()
+                if b.is_Rational:
+                    # (p/q)^n needs digits for both p^n and q^n
+                    size = math.log10(max(abs(b.p), abs(b.q)))
+                elif b.is_zero:
+                    continue
+                else:
+                    size = float(abs(sp.log(abs(sp.N(b)), 10)))
+                    if not math.isfinite(size):
+                        continue  # oo, zoo: nothing to expand
+                digits += e * size
+                too_big = digits > _MAX_DIGITS
+        except TypeError:
+            # comparisons with non-real values (nan, zoo, complex)
+            continue
+        if too_big:
+            raise ValueError("Number too large")
+
+@lru_cache(maxsize=8192)
+def _cached_parse(s, unevaluated=False):
+    """parse_expr memoized on the input string (SymPy objects are immutable).
+
+    Raises ValueError for input rejected by _check_size.
+    """
+    _check_size(s)
+    return parse_expr(s, transformations=_TX, local_dict=_UNEVALUATED if unevaluated else _LOCAL)
 
 # helper: parse variable (default x)
+_SYM_RE = re.compile(r"[A-Za-z]+")
+# function names and constants that aren't free symbols
+_FUNCS = frozenset({"sin","cos","tan","log","exp","sqrt","diff","integrate","solve","simplify","pi","oo"})
+
+@lru_cache(maxsize=8192)
 def detect_symbols(expr_str):
     # find letters a-z as symbols (simple heuristic)
-    names = sorted(set(re.findall(r"[A-Za-z]+", expr_str)))
-    # exclude function names like sin, cos, diff, integrate, sqrt etc.
-    funcs = {"sin","cos","tan","log","exp","sqrt","diff","integrate","solve","simplify"}
-    names = [n for n in names if n.lower() not in funcs]
+    found = dict.fromkeys(m.group() for m in _SYM_RE.finditer(expr_str)
+                          if m.group().lower() not in _FUNCS)
+    names = sorted(found)
     if not names:
-        return sp.symbols('x')
-    return sp.symbols(' '.join(names))
+        return _COMMON_SYMS['x']
+    syms = tuple(_COMMON_SYMS.get(n) or sp.Symbol(n) for n in names)
+    # a single name gives a bare Symbol, like sp.symbols does
+    return syms[0] if len(syms) == 1 else syms
 
 def get_primary_symbol(symbols):
     """Return a single primary symbol from possibly a tuple of symbols."""
     if isinstance(symbols, (list, tuple)):
-        return symbols[0] if symbols else sp.symbols('x')
+        return symbols[0] if symbols else _COMMON_SYMS['x']
     return symbols
 
+# --- worker pool -------------------------------------------------------------
+# SymPy calls can run for seconds, so step generators execute in worker
+# processes and the Flask thread gives up after _SOLVE_TIMEOUT seconds.
+# Where SIGALRM exists, workers also abort a task after _WORKER_BUDGET
+# seconds so a pathological input doesn't keep the process busy.
+_SOLVE_TIMEOUT = 10
+_WORKER_BUDGET = 5
+_POOL = None
+_POOL_LOCK = threading.Lock()
+_IN_WORKER = False
+_TASK_IDS = itertools.count(1)
+# in workers: shared array of the task id each worker is running (0 = idle)
+# and this worker's slot in it
+_RUNNING = None
+_SLOT = None
+
+class _BudgetExceeded(BaseException):
+    """Raised by the SIGALRM handler. Not an Exception, so the generators'
+    generic error handlers can't turn it into a (cached) step message."""
+
+def _alarm(signum, frame):
+    raise _BudgetExceeded
+
+def _init_worker(running, next_slot):
+    global _IN_WORKER, _RUNNING, _SLOT
+    _IN_WORKER = True
+    _RUNNING = running
+    with next_slot.get_lock():
+        _SLOT = next_slot.value % len(running)
+        next_slot.value += 1
+    if hasattr(signal, 'SIGALRM'):
+        signal.signal(signal.SIGALRM, _alarm)
+    __import__('sympy')
+
+def _run_in_worker(task_id, func, *args, **kwargs):
+    """Pool entry point: run func within the _WORKER_BUDGET alarm.
+
+    task_id is published in _RUNNING while func runs, so the web process can
+    tell a stuck task from one still waiting in the executor's queue.
+    """
+    _RUNNING[_SLOT] = task_id
+    try:
+        if not hasattr(signal, 'SIGALRM'):
+            return func(*args, **kwargs)
+        signal.alarm(_WORKER_BUDGET)
+        try:
+            return func(*args, **kwargs)
+        except _BudgetExceeded:
+            raise TimeoutError(f"Timed out after {_WORKER_BUDGET} seconds") from None
+        finally:
+            signal.alarm(0)
+    finally:
+        _RUNNING[_SLOT] = 0
+
+def _get_pool():
+    """Create the worker pool on first use (not at import, which workers repeat)."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            workers = os.cpu_count()
+            running = multiprocessing.Array('q', workers)
+            _POOL = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                        initargs=(running, multiprocessing.Value('i', 0)))
+            _POOL.running_tasks = running
+        return _POOL
+
+def _reset_pool(pool):
+    """Drop pool so the next _get_pool() starts a fresh one."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is pool:
+            _POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _kill_pool(pool):
+    """Terminate pool's workers and replace it; other in-flight calls retry."""
+    # ProcessPoolExecutor has no public way to stop a running task
+    for proc in list(pool._processes.values()):
+        proc.terminate()
+    _reset_pool(pool)
+
+def _submit(func, *args, **kwargs):
+    """Run func in the worker pool and wait up to _SOLVE_TIMEOUT seconds.
+
+    A pool broken by a dead worker (e.g. OOM-killed) is replaced and the call
+    retried once; so is a call cancelled because another caller replaced it.
+    """
+    for attempt in range(2):
+        pool = _get_pool()
+        task_id = next(_TASK_IDS)
+        try:
+            fut = pool.submit(_run_in_worker, task_id, func, *args, **kwargs)
+            return fut.result(timeout=_SOLVE_TIMEOUT)
+        except (BrokenProcessPool, concurrent.futures.CancelledError):
+            # CancelledError: our pending call was dropped when another
+            # caller replaced the pool
+            _reset_pool(pool)
+            if attempt:
+                raise
+        except concurrent.futures.TimeoutError:
+            if fut.done():
+                # the worker's own budget expired; the pool is healthy
+                raise
+            if task_id in pool.running_tasks[:]:
+                # running past the worker's alarm, so it is stuck in C code;
+                # replace the pool rather than lose the worker
+                _kill_pool(pool)
+            else:
+                # never started (the executor marks queued calls RUNNING too,
+                # so fut.cancel() can fail); drop it if we still can
+                fut.cancel()
+            raise
+
+def _timeout_message(exc):
+    """Text for a timeout: the worker's own budget message, else the web-side wait."""
+    return str(exc) or f"Timed out after {_SOLVE_TIMEOUT} seconds"
+
+def _memoize_steps(func):
+    """Memoize a step generator on its sanitized query.
+
+    Generators are pure functions of their input, so identical submissions
+    reuse the cached (result, steps) pair. Entries are stored as tuples so a
+    caller can't mutate the cache; every call hands back fresh lists.
+
+    The cache lives in the web process only: misses are computed in the
+    worker pool, where the generator runs uncached. Raises
+    concurrent.futures.TimeoutError after _SOLVE_TIMEOUT seconds.
+    """
+    @lru_cache(maxsize=2048)
+    def cached(query, *args, **kwargs):
+        result, steps = _submit(wrapper, query, *args, **kwargs)
+        if isinstance(result, list):
+            result = tuple(result)
+        return result, tuple(steps)
+
+    @wraps(func)
+    def wrapper(query, *args, **kwargs):
+        query = sanitize_input(query)
+        if isinstance(query, str) and len(query) > _MAX_INPUT_LEN:
+            return None, ["Input too large"]
+        if _IN_WORKER:
+            return func(query, *args, **kwargs)
+        result, steps = cached(query, *args, **kwargs)
+        if isinstance(result, tuple):
+            result = list(result)
+        return result, list(steps)
+
+    wrapper.cache_clear = cached.cache_clear
+    wrapper.cache_info = cached.cache_info
+    return wrapper
+
+def _numeric_quadratic_roots(a, b, c):
+    """Roots of a*x**2 + b*x + c for numeric coefficients without SymPy's solver.
+
+    Rational coefficients are handled exactly when the discriminant is a
+    perfect square; coefficients involving floats use complex floating point.
+    Returns None when the symbolic path is needed.
+    """
+    if all(coef.is_Rational for coef in (a, b, c)):
+        disc = b*b - 4*a*c
+        if disc < 0:
+            return None
+        rp, rq = math.isqrt(disc.p), math.isqrt(disc.q)
+        if rp*rp != disc.p or rq*rq != disc.q:
+            return None
+        r = sp.Rational(rp, rq)
+        return [(-b + r) / (2*a), (-b - r) / (2*a)]
+    if all(coef.is_Float or coef.is_Rational for coef in (a, b, c)):
+        A, B, C = complex(a), complex(b), complex(c)
+        d = cmath.sqrt(B*B - 4*A*C)
+        roots = []
+        for r in ((-B + d) / (2*A), (-B - d) / (2*A)):
+            roots.append(sp.Float(r.real) if r.imag == 0 else sp.Float(r.real) + sp.Float(r.imag)*sp.I)
+        return roots
+    return None
+
+_CSE_MIN_OPS = 50
+
+def _cse_steps(expr):
+    """Extra steps for a large result, written in terms of its common subexpressions.
+
+    The returned result itself is left whole; this only shortens the explanation.
+    """
+    if sp.count_ops(expr) <= _CSE_MIN_OPS:
+        return []
+    subs, reduced = sp.cse(expr)
+    if not subs:
+        return []
+    return ["Common subexpressions: " + ", ".join(f"{sym} = {_fmt(val)}" for sym, val in subs),
+            f"Result in terms of them: {_fmt(reduced[0])}"]
+
 # Step generators for common tasks
-def solve_equation_steps(equation_str):
+@_memoize_steps
+def solve_equation_steps(equation_str, with_steps=True):
     # handles expressions like "2*x+3=7" or "x^2-5*x+6=0"
     normalized = sanitize_input(equation_str)
-    lhs_rhs = normalized.split('=')
-    if len(lhs_rhs) != 2:
+    lhs, sep, rhs = normalized.partition('=')
+    if not sep or '=' in rhs:
         return None, ["Equation must contain exactly one '=' sign."]
-    lhs, rhs = lhs_rhs
-    syms = detect_symbols(normalized)
     try:
-        lhs_e = sp.sympify(lhs)
-        rhs_e = sp.sympify(rhs)
+        lhs_e = _cached_parse(lhs)
+        rhs_e = _cached_parse(rhs)
     except Exception as e:
         return None, [f"Parsing error: {e}"]
 
     eq = sp.Eq(lhs_e, rhs_e)
     # Try linear/quadratic detection by degrees
-    poly = sp.simplify(lhs_e - rhs_e)
-    steps = [f"Original equation: {sp.pretty(eq)}", f"Simplify to one side: {sp.pretty(sp.expand(poly))} = 0"]
-    # Quadratic?
+    # a single expand is enough for Poly; a full simplify pass isn't needed
+    poly_expanded = sp.expand(lhs_e - rhs_e)
+    steps = []
+    if with_steps:
+        steps += [f"Original equation: {_fmt(lhs_e)} = {_fmt(rhs_e)}", f"Simplify to one side: {_fmt(poly_expanded)} = 0"]
+    # Quadratic? check the degree in the primary symbol before building a Poly,
+    # other symbols are treated as coefficients
+    primary = _primary_of(poly_expanded)
     try:
-        p = sp.Poly(sp.expand(poly), syms)
-        degree = p.degree()
-    except Exception:
+        degree = sp.degree(poly_expanded, gen=primary)
+    except sp.PolynomialError:
         degree = None
+    if degree in (1, 2):
+        p = sp.Poly(poly_expanded, primary)
 
     if degree == 1:
         # linear ax + b = 0 -> ax = -b -> x = -b/a
         coeffs = p.all_coeffs()  # [a, b]
         a, b = coeffs
-        steps.append(f"Linear equation with a={a}, b={b}")
+        if with_steps:
+            steps.append(f"Linear equation with a={a}, b={b}")
         if a == 0:
-            steps.append("Coefficient a is 0 -> no or infinite solutions.")
-            sol = sp.solve(eq, syms)
+            if with_steps:
+                steps.append("Coefficient a is 0 -> no or infinite solutions.")
+            sol = sp.solve(eq, primary)
             return sol, steps
         sol_val = -b/a
-        steps.append(f"Solve: {syms} = -b/a = {sp.nsimplify(sol_val)}")
-        sol = [sp.simplify(sol_val)]
+        if not (a.is_number and b.is_number):
+            # symbolic coefficients (other symbols) can leave a reducible
+            # fraction, e.g. (y**2 - 1)/(y + 1)
+            sol_val = sp.cancel(sol_val)
+        if with_steps:
+            steps.append(f"Solve: {primary} = -b/a = {sp.nsimplify(sol_val)}")
+        sol = [sol_val]
         return sol, steps
     elif degree == 2:
         a, b, c = p.all_coeffs()
-        steps.append(f"Quadratic detected with a={a}, b={b}, c={c}")
+        sol = _numeric_quadratic_roots(a, b, c)
         disc = b**2 - 4*a*c
-        steps.append(f"Discriminant Δ = b² - 4ac = {sp.pretty(disc)}")
-        if disc < 0:
-            steps.append("Δ < 0 → complex roots")
         sqrt_disc = sp.sqrt(disc)
         x1 = (-b + sqrt_disc) / (2*a)
-        x2 = (-b - sqrt_disc) / (2*a)
-        steps.append(f"Roots: x = (-b ± √Δ) / (2a) → {sp.pretty(x1)}, {sp.pretty(x2)}")
-        sol = [sp.simplify(x1), sp.simplify(x2)]
+        if sol is None:
+            sol = sp.roots(p, multiple=True)
+            # sp.roots has its own order; list the (-b + √Δ) root first, as
+            # _numeric_quadratic_roots and the "Roots" step do
+            if len(sol) == 2 and sol[0] != sol[1] and (sol[1] - x1).equals(0):
+                sol.reverse()
+        if with_steps:
+            x2 = (-b - sqrt_disc) / (2*a)
+            steps.append(f"Quadratic detected with a={a}, b={b}, c={c}")
+            steps.append(f"Discriminant Δ = b² - 4ac = {_fmt(disc)}")
+            if disc.is_negative:
+                steps.append("Δ < 0 → complex roots")
+            steps.append(f"Roots: x = (-b ± √Δ) / (2a) → {_fmt(x1)}, {_fmt(x2)}")
         return sol, steps
     else:
-        steps.append("Using SymPy general solve")
         try:
-            sol = sp.solve(eq, syms)
-            steps.append(f"Solutions: {sp.pretty(sol)}")
+            # solveset is cheaper than solve; infinite or conditional solution
+            # sets (e.g. sin(x) = 0) still go through solve, for the same
+            # symbol so the answer's shape doesn't depend on the path
+            solset = sp.solveset(eq, primary, domain=sp.S.Complexes)
+            if isinstance(solset, sp.FiniteSet):
+                sol = list(solset)
+            else:
+                sol = sp.solve(eq, primary)
+            if with_steps:
+                steps += ["Using SymPy general solve", f"Solutions: {_fmt(sol)}"]
             return sol, steps
         except Exception as e:
             return None, [f"Could not solve: {e}"]
 
-def simplify_steps(expr_str):
+@_memoize_steps
+def simplify_steps(expr_str, with_steps=True):
     expr_str = sanitize_input(expr_str)
     syms = detect_symbols(expr_str)
     try:
-        e = sp.sympify(expr_str)
+        e = _cached_parse(expr_str)
     except Exception as ex:
         return None, [f"Parsing error: {ex}"]
-    steps = [f"Original: {sp.pretty(e)}"]
     simplified = sp.simplify(e)
-    steps.append(f"Simplified: {sp.pretty(simplified)}")
-    return simplified, steps
+    if not with_steps:
+        return simplified, []
+    return simplified, [f"Original: {_fmt(e)}", f"Simplified: {_fmt(simplified)}"] + _cse_steps(simplified)
+
+# "d/dx expr" notation, rewritten to diff(expr, x)
+_DDX_RE = re.compile(r'^d/d([A-Za-z]\w*)\s*(.+)$')
 
-def derivative_steps(expr_str, var=None):
-    # expr_str like "diff(sin(x)*x, x)" or "sin(x)*x"
+@_memoize_steps
+def derivative_steps(expr_str, var=None, with_steps=True):
+    # expr_str like "diff(sin(x)*x, x)", "d/dx(x^2)" or "sin(x)*x"
     expr_str = sanitize_input(expr_str)
-    if expr_str.strip().lower().startswith('diff('):
-        # try to eval inside
+    m = _DDX_RE.match(expr_str)
+    if m:
+        expr_str = f"diff({m.group(2)}, {m.group(1)})"
+    if expr_str.lower().startswith('diff('):
+        # the parser only knows the lower-case name, DIFF( would become a symbol
+        expr_str = 'diff(' + expr_str[5:]
+        # let the parser read the arguments, so nested commas and repeated
+        # variables like diff(x^3, x, 2) work
         try:
-            inner = expr_str.strip()[5:-1]
-            parts = inner.split(',')
-            expr_part = parts[0]
-            var = parts[1].strip() if len(parts)>1 else None
-        except:
-            expr_part = expr_str
+            parsed = _cached_parse(expr_str, unevaluated=True)
+        except Exception as ex:
+            return None, [f"Parsing error: {ex}"]
+        if not isinstance(parsed, sp.Derivative):
+            d = parsed.doit()
+            if not with_steps:
+                return d, []
+            return d, [f"Expression: {_fmt(parsed)}", f"Result: {_fmt(d)}"]
+        f, wrt = parsed.expr, parsed.variables
     else:
-        expr_part = expr_str
-    if var is None:
-        var = get_primary_symbol(detect_symbols(expr_part))
-    try:
-        f = sp.sympify(expr_part)
-    except Exception as ex:
-        return None, [f"Parsing error: {ex}"]
-    steps = [f"Function: {sp.pretty(f)}", f"Differentiate w.r.t {var}"]
-    # Basic rule attempts
-    d = sp.diff(f, var)
-    steps.append(f"Result: {sp.pretty(d)}")
+        try:
+            f = _cached_parse(expr_str)
+        except Exception as ex:
+            return None, [f"Parsing error: {ex}"]
+        wrt = (var if var is not None else _primary_of(f),)
+    # Basic rule attempts. Integer powers are passed through as is: rewriting
+    # x**n as an unevaluated product measured no faster in diff or integrate
+    # and leaks forms like (x*x + 1)**2 into the result.
+    d = sp.diff(f, *wrt)
+    if not with_steps:
+        return d, []
+    steps = [f"Function: {_fmt(f)}", f"Differentiate w.r.t {', '.join(map(str, wrt))}"]
+    steps.append(f"Result: {_fmt(d)}")
+    steps += _cse_steps(d)
     return d, steps
 
-def integral_steps(expr_str, var=None):
+@_memoize_steps
+def integral_steps(expr_str, var=None, with_steps=True):
     # expr like "integrate(x^2, x)" or "x^2"
     expr_str = sanitize_input(expr_str)
-    if expr_str.strip().lower().startswith('integrate('):
+    if expr_str.lower().startswith('integrate('):
+        expr_str = 'integrate(' + expr_str[10:]
+        # as in derivative_steps; limits like integrate(x, (x, 0, 1)) come along
         try:
-            inner = expr_str.strip()[10:-1]
-            parts = inner.split(',')
-            expr_part = parts[0]
-            var = parts[1].strip() if len(parts)>1 else None
-        except:
-            expr_part = expr_str
+            parsed = _cached_parse(expr_str, unevaluated=True)
+        except Exception as ex:
+            return None, [f"Parsing error: {ex}"]
+        if not isinstance(parsed, sp.Integral):
+            try:
+                I = parsed.doit()
+            except Exception as e:
+                return None, [f"Could not integrate: {e}"]
+            if not with_steps:
+                return I, []
+            return I, [f"Expression: {_fmt(parsed)}", f"Result: {_fmt(I)}"]
+        f, limits = parsed.function, parsed.limits
     else:
-        expr_part = expr_str
-    if var is None:
-        var = get_primary_symbol(detect_symbols(expr_part))
-    try:
-        f = sp.sympify(expr_part)
-    except Exception as ex:
-        return None, [f"Parsing error: {ex}"]
-    steps = [f"Integrand: {sp.pretty(f)}", f"Integrate w.r.t {var}"]
+        try:
+            f = _cached_parse(expr_str)
+        except Exception as ex:
+            return None, [f"Parsing error: {ex}"]
+        limits = ((var if var is not None else _primary_of(f),),)
+    definite = any(len(limit) == 3 for limit in limits)
     try:
-        I = sp.integrate(f, var)
-        steps.append(f"Result: {sp.pretty(I)} + C")
-        return I, steps
+        I = sp.integrate(f, *limits)
     except Exception as e:
         return None, [f"Could not integrate: {e}"]
+    if not with_steps:
+        return I, []
+    steps = [f"Integrand: {_fmt(f)}", f"Integrate w.r.t {', '.join(str(limit[0]) for limit in limits)}"]
+    steps.append(f"Result: {_fmt(I)}" if definite else f"Result: {_fmt(I)} + C")
+    steps += _cse_steps(I)
+    return I, steps
+
+@_memoize_steps
+def evaluate_steps(expr_str, with_steps=True):
+    expr_str = sanitize_input(expr_str)
+    # try evaluate or simplify
+    try:
+        val = _cached_parse(expr_str)
+    except Exception:
+        return simplify_steps(expr_str, with_steps=with_steps)
+    result = sp.N(val)
+    if not with_steps:
+        return result, []
+    return result, [f"Parsed value: {_fmt(val)}", f"Numeric evaluation: {result}"]
+
+# auto-detect common commands in a single scan; among the groups that match,
+# the leftmost one picks the handler
+_DISPATCH_RE = re.compile(
+    r'(?P<diff>^diff|d/d)|(?P<integrate>^int\(|integrate)|(?P<simplify>simplify|/)',
+    re.I,
+)
+_HANDLERS = {
+    'solve': solve_equation_steps,
+    'diff': derivative_steps,
+    'integrate': integral_steps,
+    'simplify': simplify_steps,
+    'eval': evaluate_steps,
+}
+
+def _route(query, kind='auto'):
+    """Return the _HANDLERS key for query; an explicit kind always wins."""
+    if kind in _HANDLERS:
+        return kind
+    if '=' in query:
+        return 'solve'
+    m = _DISPATCH_RE.search(query)
+    return m.lastgroup if m else 'eval'
+
+@lru_cache(maxsize=256)
+def _compile_numeric(expr):
+    """Build numeric functions for expr once per worker.
+
+    Returns (symbol names, fast, slow): slow is the lambdified function and
+    fast its numba-compiled version when numba is installed. numba can't
+    cache lambdified code on disk, so compilation happens on first use.
+    """
+    syms = tuple(sorted(expr.free_symbols, key=str))
+    slow = sp.lambdify(syms, expr, _LAMBDIFY_MODULE)
+    fast = njit(slow) if njit is not None else slow
+    return tuple(str(s) for s in syms), fast, slow
+
+def _evaluate_at(query, values):
+    """Evaluate query numerically with values mapping symbol names to numbers.
+
+    The result is always {"re": float, "im": float}, even for real values.
+    """
+    expr = _cached_parse(query)
+    names, fast, slow = _compile_numeric(expr)
+    missing = [n for n in names if n not in values]
+    if missing:
+        raise ValueError(f"Missing values for: {', '.join(missing)}")
+    args = [complex(values[n]) for n in names]
+    value = None
+    if all(a.imag == 0 for a in args):
+        value = _call_numeric(fast, slow, [a.real for a in args])
+    if value is None or not cmath.isfinite(value):
+        # real arguments give nan for sqrt(-1) or log(-1); retry in complex
+        value = _call_numeric(fast, slow, args)
+    if not cmath.isfinite(value):
+        # JSON has no NaN/Infinity
+        raise ValueError("Result is not finite")
+    return {"re": value.real, "im": value.imag}
+
+def _call_numeric(fast, slow, args):
+    try:
+        return complex(fast(*args))
+    except Exception:
+        # numba can't type every SymPy function; fall back to plain lambdify
+        return complex(slow(*args))
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
@@ -168,78 +619,101 @@ def index():
         raw_query = request.form.get('query','')
         query = sanitize_input(raw_query)
         kind = request.form.get('kind','auto')
-        # auto-detect common commands
         try:
-            if kind == 'auto':
-                qlow = query.lower()
-                if '=' in query:
-                    sol, steps = solve_equation_steps(query)
-                    result = sol
-                elif qlow.startswith('diff') or qlow.startswith('d/d') or 'd/d' in qlow:
-                    out, steps = derivative_steps(query)
-                    result = out
-                elif qlow.startswith('integrate') or qlow.startswith('int(') or 'integrate' in qlow:
-                    out, steps = integral_steps(query)
-                    result = out
-                elif qlow.startswith('simplify') or '/' in query or 'simplify' in qlow:
-                    out, steps = simplify_steps(query)
-                    result = out
-                else:
-                    # try evaluate or simplify
-                    try:
-                        val = sp.sympify(query)
-                        result = sp.N(val)
-                        steps = [f"Parsed value: {sp.pretty(val)}", f"Numeric evaluation: {result}"]
-                    except Exception:
-                        out, steps = simplify_steps(query)
-                        result = out
-            elif kind == 'solve':
-                sol, steps = solve_equation_steps(query)
-                result = sol
-            elif kind == 'diff':
-                out, steps = derivative_steps(query)
-                result = out
-            elif kind == 'integrate':
-                out, steps = integral_steps(query)
-                result = out
-            elif kind == 'simplify':
-                out, steps = simplify_steps(query)
-                result = out
+            result, steps = _HANDLERS[_route(query, kind)](query)
+        except concurrent.futures.TimeoutError as e:
+            steps = [_timeout_message(e)]
+            return render_template('index.html', result=None, steps=steps, query=query), 504
         except Exception as e:
             steps = [f"Error processing: {e}"]
             result = None
     return render_template('index.html', result=result, steps=steps, query=query)
 
+@app.route('/cache/clear')
+def cache_clear():
+    for cached in (solve_equation_steps, simplify_steps, derivative_steps,
+                   integral_steps, evaluate_steps, _sanitize_cached, _cached_parse,
+                   detect_symbols):
+        cached.cache_clear()
+    return jsonify({"cleared": True})
+
+def _dispatch_one(raw_query, kind='auto', with_steps=True):
+    """Solve one API query; returns (json payload, HTTP status).
+
+    with_steps=False skips building the explanation and returns empty steps.
+    """
+    query = sanitize_input(raw_query)
+    if not query:
+        return {"error":"No query provided"}, 400
+    try:
+        route = _route(query, kind)
+        out, steps = _HANDLERS[route](query, with_steps=with_steps)
+        if route == 'solve':
+            return {"result": [str(s) for s in out] if out else None, "steps": steps}, 200
+        return {"result": str(out), "steps": steps}, 200
+    except concurrent.futures.TimeoutError as e:
+        return {"error": _timeout_message(e)}, 504
+    except Exception as e:
+        return {"error": str(e)}, 500
+
 @app.route('/api/solve', methods=['POST'])
 def api_solve():
     data = request.json or {}
-    raw_query = data.get('query','')
-    query = sanitize_input(raw_query)
-    kind = data.get('kind','auto')
-    # reuse logic but return json
-    # (for brevity, call index logic by simulating a post)
-    # We'll do a very light implementation:
-    if not query:
+    payload, status = _dispatch_one(data.get('query',''), data.get('kind','auto'),
+                                    with_steps=bool(data.get('steps', True)))
+    return jsonify(payload), status
+
+@app.route('/api/evaluate', methods=['POST'])
+def api_evaluate():
+    """{"query": str, "values": {name: number}} -> {"result": {"re": float, "im": float}}"""
+    data = request.json or {}
+    query = sanitize_input(data.get('query',''))
+    values = data.get('values', {})
+    if not query or not isinstance(query, str):
         return jsonify({"error":"No query provided"}), 400
+    if not isinstance(values, dict):
+        return jsonify({"error":"values must be an object"}), 400
+    if len(query) > _MAX_INPUT_LEN:
+        return jsonify({"error":"Input too large"}), 400
     try:
-        if '=' in query and kind in ('auto','solve'):
-            sol, steps = solve_equation_steps(query)
-            return jsonify({"result": [str(s) for s in sol] if sol else None, "steps": steps})
-        qlow = query.lower()
-        if kind in ('auto','diff') and (qlow.startswith('diff') or 'd/d' in qlow):
-            out, steps = derivative_steps(query)
-            return jsonify({"result": str(out), "steps": steps})
-        if kind in ('auto','integrate') and (qlow.startswith('integrate') or qlow.startswith('int(') or 'integrate' in qlow):
-            out, steps = integral_steps(query)
-            return jsonify({"result": str(out), "steps": steps})
-        if kind in ('auto','simplify') and (qlow.startswith('simplify') or 'simplify' in qlow or '/' in query):
-            out, steps = simplify_steps(query)
-            return jsonify({"result": str(out), "steps": steps})
-        # else evaluate
-        val = sp.sympify(query)
-        return jsonify({"result": str(sp.N(val)), "steps":[f"Parsed: {str(val)}"]})
+        return jsonify({"result": _submit(_evaluate_at, query, values)})
+    except concurrent.futures.TimeoutError as e:
+        return jsonify({"error": _timeout_message(e)}), 504
+    # malformed input fails in parse_expr (SyntaxError, TokenError) or, for
+    # functions lambdify has no numeric version of, with a NameError
+    except (ValueError, TypeError, ArithmeticError, SyntaxError, TokenError, NameError) as e:
+        return jsonify({"error": str(e) or type(e).__name__}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+_BATCH_LIMIT = 256
+
+@app.route('/api/solve_batch', methods=['POST'])
+def api_solve_batch():
+    data = request.json or {}
+    items = data.get('items', [])
+    if not isinstance(items, list):
+        return jsonify({"error":"items must be a list"}), 400
+    if len(items) > _BATCH_LIMIT:
+        return jsonify({"error":f"At most {_BATCH_LIMIT} items per batch"}), 400
+    keys = []
+    for item in items:
+        item = item if isinstance(item, dict) else {}
+        query, kind = item.get('query',''), item.get('kind','auto')
+        keys.append((query if isinstance(query, str) else '',
+                     kind if isinstance(kind, str) else 'auto',
+                     bool(item.get('steps', True))))
+    # solve each distinct query once, fanning out to the worker pool
+    unique = list(dict.fromkeys(keys))
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as threads:
+        solved = dict(zip(unique, threads.map(lambda key: _dispatch_one(*key)[0], unique)))
+    return jsonify({"results": [solved[key] for key in keys]})
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    try:
+        from waitress import serve
+    except ImportError:
+        # development server fallback
+        app.run(debug=True)
+    else:
+        serve(app, host='0.0.0.0', port=5000, threads=8)